@@ -5,9 +5,25 @@
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import argparse
+import contextlib
+import csv
+import importlib
+import itertools
+import math
 import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from simulate_game import play_game
+import simulate_game
+from simulate_game import GameResult, play_game
+
+# Parameters of the sequential probability ratio test that can end a match early: it decides between the hypotheses
+# that the player scores SPRT_P0 and SPRT_P1 points per game, with error rates SPRT_ALPHA and SPRT_BETA respectively.
+SPRT_P0, SPRT_P1 = 0.5, 0.65
+SPRT_ALPHA, SPRT_BETA = 0.05, 0.05
 
 
 # Prints 1 instead of 1.0
@@ -15,29 +31,134 @@ def print_score(x: float) -> str:
     return '0' if x == 0 else str(x).rstrip('0').rstrip('.')
 
 
-# Play a match between player and opponent.
-def play_match(player: str, opponent: str, count: int, board_file: str, calculation_time: float, verbose=False, warmup=False) -> None:
-    player_score = 0.0
-    opponent_score = 0.0
-    result_lines = []
+# Play a game and return its result together with the number of seconds it took.
+def play_timed_game(board_file: str, name1: str, name2: str, calculation_time: float, verbose: bool, warmup: bool) -> tuple[GameResult, float]:
+    start = time.perf_counter()
+    result = play_game(board_file, name1, name2, calculation_time, verbose, warmup)
+    return result, time.perf_counter() - start
+
+
+# Whether the next game played by this process should start with a warm-up.
+warmup_pending = False
+
+
+# Initializes a process that plays games of a match.
+def init_game_process(solver: str, warmup: bool) -> None:
+    global warmup_pending
+    simulate_game.SUDOKU_SOLVER = solver
+    warmup_pending = warmup
+
 
-    for i in range(1, count+1):
-        print(f'Playing game {i}')
-        player_starts = i % 2 == 1
-        first = player if player_starts else opponent
-        second = opponent if player_starts else player
-        result = play_game(board_file, first, second, calculation_time, verbose, warmup and i == 1)
+# Play a game in a temporary working directory. Players save their data in the working directory,
+# so games that are played at the same time need a directory of their own. Their output would get mixed up as well,
+# so it is discarded unless verbose is set; the match prints the result of every game.
+# Like the first game of a sequential match, the first game of every process starts with a warm-up if requested.
+def play_game_in_own_directory(board_file: str, name1: str, name2: str, calculation_time: float, verbose: bool):
+    global warmup_pending
+    warmup, warmup_pending = warmup_pending, False
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as game_directory, open(os.devnull, 'w') as devnull:
+        os.chdir(game_directory)
+        try:
+            with contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+                return play_timed_game(board_file, name1, name2, calculation_time, verbose, warmup)
+        finally:
+            os.chdir(cwd)
 
+
+# Play a match between player and opponent, with up to 'workers' games at the same time.
+# If csv_file is given, a row with the result and duration of every game is appended to it.
+# If sprt is set, the match ends as soon as a sequential probability ratio test decides whether the player is stronger.
+def play_match(player: str, opponent: str, count: int, board_file: str, calculation_time: float, verbose=False, warmup=False, workers=1, csv_file=None, sprt=False) -> None:
+    player_score = 0.0
+    opponent_score = 0.0
+    result_lines = {}  # game number -> result line
+    # Running mean and sum of squared deviations of the player's score per game (Welford's algorithm).
+    games_played, mean_score, squared_deviations = 0, 0.0, 0.0
+    log_likelihood_ratio = 0.0  # log of P(results | player scores SPRT_P1) / P(results | player scores SPRT_P0)
+    unpaired_scores = {}  # (i + 1) // 2 -> the player's score in game i, while the other game of that pair is unfinished
+    sprt_outcome = None
+
+    def add_result(i: int, first: str, second: str, result: GameResult, seconds: float) -> None:
+        nonlocal player_score, opponent_score, games_played, mean_score, squared_deviations, log_likelihood_ratio, sprt_outcome
         result_line = f'{first} - {second} {print_score(result[0])}-{print_score(result[1])}\n'
-        result_lines.append(result_line)
+        result_lines[i] = result_line
         print(result_line)
 
-        if player_starts:
-            player_score += result[0]
-            opponent_score += result[1]
+        score = result[0] if i % 2 == 1 else result[1]
+        player_score += score
+        opponent_score += result[1] if i % 2 == 1 else result[0]
+        if csv_output:
+            csv_writer.writerow([Path(board_file).stem, calculation_time, i, first, second, result[0], result[1], score, f'{seconds:.3f}'])
+            csv_output.flush()
+
+        games_played += 1
+        delta = score - mean_score
+        mean_score += delta / games_played
+        squared_deviations += delta * (score - mean_score)
+        if games_played > 1:
+            margin = 1.96 * math.sqrt(squared_deviations / (games_played - 1) / games_played)
+            print(f'{player} scores {mean_score:.2f} per game so far (95% confidence interval: +/- {margin:.2f})')
+
+        # Games 2k-1 and 2k are played with swapped colours, so the test only counts pairs of which both games finished,
+        # also when games finish out of order. A draw counts as half a win.
+        pair = (i + 1) // 2
+        if pair not in unpaired_scores:
+            unpaired_scores[pair] = score
         else:
-            player_score += result[1]
-            opponent_score += result[0]
+            for pair_score in (unpaired_scores.pop(pair), score):
+                log_likelihood_ratio += pair_score * math.log(SPRT_P1 / SPRT_P0) + (1 - pair_score) * math.log((1 - SPRT_P1) / (1 - SPRT_P0))
+            if sprt and sprt_outcome is None:
+                if log_likelihood_ratio >= math.log((1 - SPRT_BETA) / SPRT_ALPHA):
+                    sprt_outcome = f'{player} is stronger than {opponent}'
+                elif log_likelihood_ratio <= math.log(SPRT_BETA / (1 - SPRT_ALPHA)):
+                    sprt_outcome = f'{player} is not stronger than {opponent}'
+
+    # The player starts the odd games, the opponent the even ones.
+    games = [(i, player, opponent) if i % 2 == 1 else (i, opponent, player) for i in range(1, count+1)]
+
+    # The file is closed even if a game raises, so the rows of the games that did finish are kept.
+    with open(csv_file, 'a', newline='') if csv_file else contextlib.nullcontext() as csv_output:
+        csv_writer = csv.writer(csv_output) if csv_output else None
+        if csv_output and csv_output.tell() == 0:
+            csv_writer.writerow(['board', 'time', 'game', 'first', 'second', 'first_score', 'second_score', 'player_score', 'seconds'])
+
+        if workers == 1:
+            for i, first, second in games:
+                print(f'Playing game {i}')
+                add_result(i, first, second, *play_timed_game(board_file, first, second, calculation_time, verbose, warmup and i == 1))
+                if sprt_outcome:
+                    break
+        else:
+            # Games run in their own working directory, so the paths they use must not depend on it.
+            print(f'Playing {count} games, {workers} at a time')
+            solver = str(Path(simulate_game.SUDOKU_SOLVER).resolve())
+            board_file = str(Path(board_file).resolve())
+            # Where possible, fork the game processes after importing the players, so no process has to import them again.
+            # Not every platform supports fork (e.g. Windows), those use their default start method.
+            for name in (player, opponent):
+                importlib.import_module(name + '.sudokuai')
+            context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+            # Pool processes are daemons, which may not start the processes a game needs, so use an executor instead.
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=init_game_process, initargs=(solver, warmup)) as executor:
+                futures = {
+                    executor.submit(play_game_in_own_directory, board_file, first, second, calculation_time, verbose): (i, first, second)
+                    for i, first, second in games
+                }
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    add_result(*futures[future], *future.result())
+                    # Games that are still running are finished and counted, only the ones that did not start are skipped.
+                    if sprt_outcome:
+                        for other_future in futures:
+                            other_future.cancel()
+
+    result_lines = [result_lines[i] for i in sorted(result_lines)]
+    if sprt_outcome:
+        result_line = f'Stopped after {games_played} of {count} games: {sprt_outcome} (sequential probability ratio test)\n'
+        result_lines.append(result_line)
+        print(result_line)
 
     result_line = f'Match result: {player} - {opponent} {print_score(player_score)}-{print_score(opponent_score)}'
     result_lines.append(result_line)
@@ -54,13 +175,23 @@ def main():
     cmdline_parser.add_argument('first', help="The module name of the first player's SudokuAI class (default: random_player)", default='random_player', nargs='?')
     cmdline_parser.add_argument('second', help="The module name of the second player's SudokuAI class (default: random_player)", default='random_player', nargs='?')
     cmdline_parser.add_argument('--count', type=int, default=6, help='The number of games (default: 6)')
-    cmdline_parser.add_argument('--board', type=str, default='boards/empty-2x2.txt', help='The text file containing the start position (default: boards/empty-2x2.txt)')
-    cmdline_parser.add_argument('--time', type=float, default=3.0, help="The time (in seconds) for computing a move (default: 3.0)")
+    cmdline_parser.add_argument('--board', type=str, action='append', help='The text file containing the start position (default: boards/empty-2x2.txt). '
+                                'The option can be repeated; if several boards and/or times are given, a match is played for each combination')
+    cmdline_parser.add_argument('--time', type=float, action='append', help="The time (in seconds) for computing a move (default: 3.0). The option can be repeated")
     cmdline_parser.add_argument('--verbose', help="Give verbose output", action="store_true")
     cmdline_parser.add_argument('--warm-up', help='Let the engines play a move before the start of the game', action='store_true')
+    cmdline_parser.add_argument('--workers', type=int, default=1, help='The number of games that are played at the same time, 0 for one per CPU core (default: 1). '
+                                'The players of these games share the CPU cores, so they may compute weaker moves in the same time')
+    cmdline_parser.add_argument('--csv', type=str, help='A CSV file to append the result and duration of every game to')
+    cmdline_parser.add_argument('--sprt', help=f'End the match as soon as a sequential probability ratio test decides whether the first player '
+                                f'scores {SPRT_P0} or {SPRT_P1} points per game', action='store_true')
     args = cmdline_parser.parse_args()
 
-    play_match(args.first, args.second, args.count, args.board, args.time, args.verbose, args.warm_up)
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+    boards = args.board or ['boards/empty-2x2.txt']
+    times = args.time or [3.0]
+    for board_file, calculation_time in itertools.product(boards, times):
+        play_match(args.first, args.second, args.count, board_file, calculation_time, args.verbose, args.warm_up, min(workers, max(args.count, 1)), args.csv, args.sprt)
 
 
 if __name__ == '__main__':
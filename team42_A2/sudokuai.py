@@ -147,9 +147,9 @@ def _make_move(game_state: GameState, move: Move) -> GameState:
     new_state.scores[new_state.current_player - 1] += move_score
 
     if new_state.current_player == 1:
-        new_state.occupied_squares1 += [move.square]
+        new_state.occupied_squares1.append(move.square)
     else:
-        new_state.occupied_squares2 += [move.square]
+        new_state.occupied_squares2.append(move.square)
 
     new_state.current_player = 3 - new_state.current_player
     return new_state
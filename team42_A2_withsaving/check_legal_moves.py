@@ -1,3 +1,5 @@
+import random
+
 from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, TabooMove, Square
 
 
@@ -13,15 +15,23 @@ def get_legal_moves(game_state: GameState) -> list[Move]:
 
     legal_moves = []
     taboo_moves = [(move.square, move.value) for move in game_state.taboo_moves]
+    # The search keeps the masks of its game states up to date with every move (see _make_move in sudokuai),
+    # only compute them from the board for game states that don't have them.
+    if hasattr(game_state, 'row_mask'):
+        row_mask, col_mask, block_mask = game_state.row_mask, game_state.col_mask, game_state.block_mask
+    else:
+        row_mask, col_mask, block_mask = get_region_masks(game_state.board)
+    tables = get_board_tables(game_state.board)
+    block_of, full_mask = tables['block_of'], tables['full_mask']
     # Iterate over all possible moves ((square, value) pairs)
     for square in allowed_squares:
-        symbols = set(range(1, N + 1))
-        symbols -= get_row(game_state.board, square)
-        symbols -= get_column(game_state.board, square)
-        symbols -= get_block(game_state.board, square)
+        # Bit (value - 1) is set if value does not occur yet in the row, column and region of this square
+        symbols = ~(
+            row_mask[square[0]] | col_mask[square[1]] | block_mask[block_of[N * square[0] + square[1]]]
+        ) & full_mask
 
-        for value in symbols:
-            if (square, value) not in taboo_moves:
+        for value in range(1, N + 1):
+            if symbols >> (value - 1) & 1 and (square, value) not in taboo_moves:
                 legal_moves.append(Move(square, value))
 
     return legal_moves
@@ -59,6 +69,59 @@ def get_block(board: SudokuBoard, square: Square) -> set[int]:
     }
 
 
+# Board-invariant lookup tables, computed once per board size (m, n) and shared by every node of the search tree.
+_BOARD_TABLES: dict[tuple[int, int], dict] = {}
+
+
+def get_board_tables(board: SudokuBoard) -> dict:
+    """Returns the lookup tables for boards with the same region size as board:
+    block_of maps the index of a square (see SudokuBoard.square2index) to the index of its region,
+    full_mask is the bitmask of a full row/column/region and board_middle is the middle row/column.
+    zobrist holds a random 64-bit number for every (square index k, value) at position k * N + value - 1,
+    the XOR of these numbers over the filled squares is the Zobrist hash of a board (see get_zobrist_hash).
+    """
+    key = (board.m, board.n)
+    if key not in _BOARD_TABLES:
+        m, n, N = board.m, board.n, board.N
+        # Use a generator of our own, so building the tables does not change the moves picked with random.
+        rng = random.Random(N)
+        _BOARD_TABLES[key] = {
+            'block_of': [r // m * m + c // n for r in range(N) for c in range(N)],
+            'full_mask': (1 << N) - 1,
+            'board_middle': N // 2,
+            'zobrist': [rng.getrandbits(64) for _ in range(N * N * N)],
+        }
+    return _BOARD_TABLES[key]
+
+
+def get_region_masks(board: SudokuBoard) -> tuple[list[int], list[int], list[int]]:
+    """Returns bitmasks of the numbers present in every row, column and region.
+    Bit (value - 1) of a mask is set if value occurs in that row/column/region, so a region is full iff its mask is (1 << N) - 1.
+    """
+    N = board.N
+    block_of = get_board_tables(board)['block_of']
+    row_mask, col_mask, block_mask = [0] * N, [0] * N, [0] * N
+    for k, value in enumerate(board.squares):
+        if value == board.empty:
+            continue
+        bit = 1 << (value - 1)
+        row_mask[k // N] |= bit
+        col_mask[k % N] |= bit
+        block_mask[block_of[k]] |= bit
+    return row_mask, col_mask, block_mask
+
+
+def get_zobrist_hash(board: SudokuBoard) -> int:
+    """Returns the Zobrist hash of the board, which can be updated for a move by XOR-ing in the number of that move."""
+    N = board.N
+    zobrist = get_board_tables(board)['zobrist']
+    zobrist_hash = 0
+    for k, value in enumerate(board.squares):
+        if value != board.empty:
+            zobrist_hash ^= zobrist[k * N + value - 1]
+    return zobrist_hash
+
+
 ### DEBUG ###
 # from competitive_sudoku.sudoku import parse_game_state
 # import os
@@ -1,6 +1,7 @@
 ### Flow: use get_legal_moves to get a list of moves, then filter it here ###
 from competitive_sudoku.sudoku import GameState, Move
 from competitive_sudoku.sudokuai import SudokuAI
+from .check_legal_moves import get_board_tables
 
 def wall_heuristic(moves: list[Move], game_state: GameState, save_data: dict) -> tuple[list[Move], dict]:
     '''
@@ -8,14 +9,19 @@ def wall_heuristic(moves: list[Move], game_state: GameState, save_data: dict) ->
     Currently this is implemented by first making a vertical line from the middle column,
     and then making a horizontal wall midway up the board.
     '''
-    board_middle = game_state.board.N // 2
+    board_middle = get_board_tables(game_state.board)['board_middle']
     filtered_moves = []
 
     # Read from save data (containing information about the phase of the strategy in the current game state).
     # If no save data is provided, we are in the first turn, so initialize it
     if(save_data is None):
         save_data = {'old_phase': 1, 'new_phase': 1, 'height': 0, 'broke_through_left': False, 'broke_through_right': False}
-    
+
+    # Fast path: once the wall strategy has concluded (phase 4, which can't be undone by a taboo move anymore)
+    # nothing gets filtered and the phase bookkeeping can't change anymore.
+    if(save_data['old_phase'] == 4 and save_data['new_phase'] == 4):
+        return moves, save_data
+
     try:
         # Check if our player's last move was declared taboo.
         # If yes, we are still in the old phase (*before* the last move was proposed); otherwise, we are in the new phase (*after* the last move went through)
@@ -31,7 +31,11 @@ def wall_heuristic(moves: list[Move], game_state: GameState, save_data: dict) ->
             # Otherwise, we are in phase 1.
 
         save_data = {'curr_phase': 1, 'height': 0, 'left_status': 0, 'right_status': 0}
-    
+
+    # Fast path: once the wall strategy has concluded (phase 6) nothing gets filtered anymore.
+    if(save_data['curr_phase'] >= 6):
+        return moves, save_data
+
     curr_phase = save_data['curr_phase']      # Keeps track of the current phase of the strategy. 1 = phase a, 2 = phase b/c, 3 = phase d, 4 = basic minimax
     height = save_data['height']              # The middlemost row number reached by the agent
     left_status = save_data['left_status']    # = 1 if we are currently building the wall to the left, 2 if we finished the wall on the left, 3 if the opponent broke through, 0 otherwise
@@ -139,69 +143,6 @@ def wall_heuristic(moves: list[Move], game_state: GameState, save_data: dict) ->
         if(curr_phase == 6):
             filtered_moves = moves
 
-        ### PHASE B/3: Build out t h e   w a l l to the first chosen side ###
-        # Build out  t h e   w a l l
-        if(curr_phase == 999):
-            middle_moves = [move for move in moves if move.square[0] == height]
-
-            # If the opponent has broken through on both sides, resort to basic minimax
-            if(broke_through_left and broke_through_right):
-                filtered_moves = moves
-                curr_phase = 4
-            # If the opponent has broken through on one side, but not the other, build on the other side.
-            elif(broke_through_left):
-                filtered_moves = [move for move in middle_moves if move.square[1] > board_middle]
-            elif(broke_through_right):
-                filtered_moves = [move for move in middle_moves if move.square[1] < board_middle]
-            # If the opponent has broken through on neither side, determine which side to prioritize
-            else:
-                # If we already started building to the left, continue the wall there
-                if(any(square[1] < board_middle for square in game_state.occupied_squares1)):
-                    filtered_moves = [move for move in middle_moves if move.square[1] < board_middle]
-                    # If we are already done on the left, go right instead
-                    if(len(filtered_moves) == 0):
-                        filtered_moves = [move for move in middle_moves if move.square[1] > board_middle]
-                        # If we also have nothing to do on the right, move on to phase D
-                        if(len(filtered_moves) == 0):
-                            curr_phase = 3
-                # Likewise, if we already started building to the right, continue that way
-                elif(any(square[1] > board_middle for square in game_state.occupied_squares1)):
-                    filtered_moves = [move for move in middle_moves if move.square[1] > board_middle]
-                    # If we are already done on the right, go left instead
-                    if(len(filtered_moves) == 0):
-                        filtered_moves = [move for move in middle_moves if move.square[1] < board_middle]
-                        # If we also have nothing to do on the left, move on to phase D
-                        if(len(filtered_moves) == 0):
-                            curr_phase = 3
-                # Otherwise, we have to choose whether to start building the wall to the right or to the left.
-                # Prioritize the side where the opponent has the *fewest* occupied squares.
-                # (This block will run once at the start of phase (b) and then never again)
-                else:
-                    opp_squares_left = len([square for square in game_state.occupied_squares2 if square[1] < board_middle])
-                    opp_squares_right = len([square for square in game_state.occupied_squares2 if square[1] > board_middle])
-                    if(opp_squares_left < opp_squares_right):
-                        filtered_moves = [move for move in middle_moves if move.square[1] < board_middle]
-                    else:
-                        filtered_moves = [move for move in middle_moves if move.square[1] > board_middle]
-
-        ### PHASE 3/D ###
-        # At this point, on both sides of the board, we've either completed our wall there or the enemy broke through
-        # In this case, allow only moves that *don't* play in captured regions, to deny the enemy as many moves as possible.
-        if(curr_phase == 999):
-            if(not broke_through_left and not broke_through_right):
-                filtered_moves = [move for move in moves if move.square[0] > height]
-            elif(not broke_through_left):
-                filtered_moves = [move for move in moves if move.square[0] > height or move.square[1] > board_middle]
-            elif(not broke_through_right):
-                filtered_moves = [move for move in moves if move.square[0] > height or move.square[1] < board_middle]
-            else:
-                curr_phase = 4
-
-        ### PHASE 4/END ###
-        # At this point the wall strategy has concluded, and we revert back to basic minimax.
-        if(curr_phase == 999):
-            filtered_moves = moves
-
     ##### PLAYER 2 #####
     # If we're player two, the process is similar, except all height comparisons are reversed
     else:
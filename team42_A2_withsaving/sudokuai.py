@@ -7,8 +7,8 @@ import math
 import random
 
 import competitive_sudoku.sudokuai
-from competitive_sudoku.sudoku import GameState, Move, SudokuBoard
-from .check_legal_moves import get_legal_moves, get_row, get_column, get_block
+from competitive_sudoku.sudoku import GameState, Move
+from .check_legal_moves import get_legal_moves, get_board_tables, get_region_masks, get_zobrist_hash
 from .evaluation import evaluate_state
 from .competitive_heuristics import wall_heuristic
 from .sudoku_heuristics import sudoku_heuristics
@@ -23,12 +23,19 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         super().__init__()
 
     def compute_best_move(self, game_state: GameState) -> None:
+        # Build the board-invariant lookup tables up front, so the search itself never has to.
+        get_board_tables(game_state.board)
+        _init_region_masks(game_state)
+        game_state.zobrist_hash = get_zobrist_hash(game_state.board)
         initial_moves = get_legal_moves(game_state)
         # Make sure we have an initial valid move, otherwise we lose the game.
         self.propose_move(random.choice(initial_moves))
 
         good_moves = sudoku_heuristics(initial_moves, game_state)
-        pruned = [move for move in initial_moves if move not in good_moves]
+        pruned = _as_pairs(initial_moves) - _as_pairs(good_moves)
+        # Results of the sudoku heuristics are kept for the whole turn, so every deeper iteration reuses the filter
+        # decisions made for the nodes it already visited in the previous iteration.
+        heuristics_cache = {}
 
         current_depth = 1
         # save_data stores information relating to the current phase of the wall strategy between game tree nodes (in memory).
@@ -39,32 +46,39 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         #("Moves: ", ["({}, {}) -> {}".format(move.square[0], move.square[1], move.value) for move in game_state.moves]) # TEST
         #print("Taboo moves: ", ["({}, {}) -> {}".format(move.square[0], move.square[1], move.value) for move in game_state.taboo_moves]) # TEST
         while True:
-            best_move, save_data = _find_best_move(game_state, save_data, our_player, current_depth, pruned)
+            best_move, save_data = _find_best_move(game_state, save_data, our_player, current_depth, pruned, heuristics_cache)
             self.propose_move(best_move)
             #print(save_data)  # TEST
             self.save(save_data)
             current_depth += 1
 
 
-def _find_best_move(game_state: GameState, save_data: dict, our_player: int, depth: int, pruned, ) -> tuple[Move, dict]:
+def _find_best_move(
+    game_state: GameState, save_data: dict, our_player: int, depth: int, pruned, heuristics_cache: dict = None
+) -> tuple[Move, dict]:
     """Find move using minimax for a given depth.
 
     Args:
           game_state: state of the game to find a move for.
           depth: depth of the search tree to explore (> 0).
+          pruned: (square, value) pairs of the moves that were filtered out by the sudoku heuristics.
+          heuristics_cache: results of the sudoku heuristics computed so far, shared between calls.
 
     Returns:
           The move with the highest score, or a random move if all moves are equally good.
     """
     initial_moves, save_data = wall_heuristic(get_legal_moves(game_state), game_state, save_data)
-    good_moves = [move for move in initial_moves if move not in pruned]
+    good_moves = [move for move in initial_moves if (move.square, move.value) not in pruned]
+    if heuristics_cache is None:
+        heuristics_cache = {}
 
     is_maximizing = game_state.current_player == 1
     scores = {}
     for i, move in enumerate(good_moves):
         new_state = _make_move(game_state, move)
         score, save_data = _minimax_alphabeta(
-            new_state, save_data, our_player, depth=depth - 1, is_maximizing=not is_maximizing, pruned=pruned
+            new_state, save_data, our_player, depth=depth - 1, is_maximizing=not is_maximizing, pruned=pruned,
+            heuristics_cache=heuristics_cache,
         )
         scores[i] = (score, save_data)
 
@@ -87,6 +101,7 @@ def _minimax_alphabeta(
     beta: float = math.inf,
     is_maximizing: bool = True,
     pruned=(),
+    heuristics_cache: dict = None,
 ) -> tuple[float, dict]:
     """Implementation of the minimax scoring function with alpa-beta pruning.
 
@@ -96,6 +111,8 @@ def _minimax_alphabeta(
         alpha: alpha value for alpha-beta pruning, -inf for initial call.
         beta: beta value for alpha-beta pruning, inf for initial call.
         is_maximizing: whether the evaluation is for the maximizing player.
+        pruned: (square, value) pairs of the moves that were filtered out by the sudoku heuristics.
+        heuristics_cache: results of the sudoku heuristics computed so far, shared between calls.
 
     Returns:
         Score for the given state.
@@ -111,9 +128,9 @@ def _minimax_alphabeta(
         #print("Post: ", save_data) # TEST
     else:
         initial_moves = get_legal_moves(game_state)
-    good_moves = [move for move in initial_moves if move not in pruned]
-    good_moves = sudoku_heuristics(good_moves, game_state)
-    pruned = [move for move in initial_moves if move not in good_moves]
+    good_moves = [move for move in initial_moves if (move.square, move.value) not in pruned]
+    good_moves = _cached_sudoku_heuristics(good_moves, game_state, heuristics_cache)
+    pruned = _as_pairs(initial_moves) - _as_pairs(good_moves)
 
     if len(good_moves) == 0:
         return evaluate_state(game_state), save_data
@@ -122,7 +139,7 @@ def _minimax_alphabeta(
         value = -math.inf
         for move in good_moves:
             new_state = _make_move(game_state, move)
-            new_value, save_data = _minimax_alphabeta(new_state, save_data, our_player, depth - 1, alpha, beta, not is_maximizing, pruned)
+            new_value, save_data = _minimax_alphabeta(new_state, save_data, our_player, depth - 1, alpha, beta, not is_maximizing, pruned, heuristics_cache)
             value = max(value, new_value)
             alpha = max(alpha, value)
             if value >= beta:
@@ -132,7 +149,7 @@ def _minimax_alphabeta(
         value = math.inf
         for move in good_moves:
             new_state = _make_move(game_state, move)
-            new_value, save_data = _minimax_alphabeta(new_state, save_data, our_player, depth - 1, alpha, beta, not is_maximizing, pruned)
+            new_value, save_data = _minimax_alphabeta(new_state, save_data, our_player, depth - 1, alpha, beta, not is_maximizing, pruned, heuristics_cache)
             value = min(value, new_value)
             beta = min(beta, value)
             if value <= alpha:
@@ -140,6 +157,21 @@ def _minimax_alphabeta(
         return value, save_data
 
 
+def _cached_sudoku_heuristics(moves: list[Move], game_state: GameState, cache: dict = None) -> list[Move]:
+    """Apply the sudoku heuristics, reusing an earlier result for the same board and considered moves if cache has one."""
+    if cache is None:
+        return sudoku_heuristics(moves, game_state)
+    key = (game_state.zobrist_hash, frozenset(_as_pairs(moves)))
+    if key not in cache:
+        cache[key] = sudoku_heuristics(moves, game_state)
+    return cache[key]
+
+
+def _as_pairs(moves: list[Move]) -> set[tuple[tuple[int, int], int]]:
+    """Convert moves to a set of (square, value) pairs, which (unlike Moves) can be hashed."""
+    return {(move.square, move.value) for move in moves}
+
+
 def _make_move(game_state: GameState, move: Move) -> GameState:
     """Create a new game state that happens after the given move was performed.
     Taboo moves are not added, the sudoku is assumed to remain solvable after any move.
@@ -155,26 +187,41 @@ def _make_move(game_state: GameState, move: Move) -> GameState:
     new_state.board.put(move.square, move.value)
     new_state.moves.append(move)
 
-    move_score = _move_score(new_state.board, move.square)
+    tables = get_board_tables(new_state.board)
+    k = new_state.board.square2index(move.square)
+    bit = 1 << (move.value - 1)
+    new_state.row_mask[move.square[0]] |= bit
+    new_state.col_mask[move.square[1]] |= bit
+    new_state.block_mask[tables['block_of'][k]] |= bit
+    new_state.zobrist_hash ^= tables['zobrist'][k * new_state.board.N + move.value - 1]
+
+    move_score = _move_score(new_state, move.square)
     new_state.scores[new_state.current_player - 1] += move_score
 
     if new_state.current_player == 1:
-        new_state.occupied_squares1 += [move.square]
+        new_state.occupied_squares1.append(move.square)
     else:
-        new_state.occupied_squares2 += [move.square]
+        new_state.occupied_squares2.append(move.square)
 
     new_state.current_player = 3 - new_state.current_player
     return new_state
 
 
-def _move_score(board: SudokuBoard, square: tuple[int, int]) -> int:
-    """Compute the score for the most recent move 'square' and a given board."""
+def _init_region_masks(game_state: GameState) -> None:
+    """Store the row/column/region bitmasks of the board on the game state, so _make_move can keep them up to date."""
+    game_state.row_mask, game_state.col_mask, game_state.block_mask = get_region_masks(game_state.board)
+
+
+def _move_score(game_state: GameState, square: tuple[int, int]) -> int:
+    """Compute the score for the most recent move 'square' and a given game state."""
     score = [0, 1, 3, 7]
-    n_filled = 0
-    for get_region in (get_row, get_column, get_block):
-        region = get_region(board, square)
-        # Region is filled if there are no empty cells.
-        is_filled = 0 not in region
-        n_filled += is_filled
+    tables = get_board_tables(game_state.board)
+    # Region is filled if all N numbers occur in it.
+    full_mask = tables['full_mask']
+    n_filled = (
+        (game_state.row_mask[square[0]] == full_mask)
+        + (game_state.col_mask[square[1]] == full_mask)
+        + (game_state.block_mask[tables['block_of'][game_state.board.square2index(square)]] == full_mask)
+    )
 
     return score[n_filled]
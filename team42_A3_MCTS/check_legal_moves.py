@@ -12,7 +12,7 @@ def get_legal_moves(game_state: GameState) -> list[Move]:
         allowed_squares = full_board(game_state)
 
     legal_moves = []
-    taboo_moves = [(move.square, move.value) for move in game_state.taboo_moves]
+    taboo_moves = {(move.square, move.value) for move in game_state.taboo_moves}
     # Iterate over all possible moves ((square, value) pairs)
     for square in allowed_squares:
         symbols = set(range(1, N + 1))
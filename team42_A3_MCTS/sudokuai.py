@@ -3,6 +3,9 @@
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import math
+import multiprocessing
+import os
+import queue
 import random
 
 import competitive_sudoku.sudokuai
@@ -10,12 +13,18 @@ from competitive_sudoku.sudoku import GameState, Move
 from .check_legal_moves import get_legal_moves
 from .monte_carlo_tree import MonteCarloTree
 
+# Number of MCTS iterations a worker process runs between two reports of its root statistics.
+REPORT_INTERVAL = 20
+
 
 class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
     """
     Sudoku AI that computes a move for a given sudoku configuration.
     """
 
+    # The kind of MCT that is grown, by this process as well as by the workers.
+    tree_class = MonteCarloTree
+
     def __init__(self):
         super().__init__()
 
@@ -26,37 +35,129 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         self.propose_move(random.choice(initial_moves))
 
         our_player_id = game_state.current_player
-        MCT = MonteCarloTree(game_state)
-
-        # Initial simulation of the root
-        result = MCT.simulate(MCT.root)
-        MCT.backpropagate(MCT.root, result, our_player_id)
-
-        while True:
-            selected_node = MCT.traverse()
-            if selected_node.visit_count > 0:
-                selected_node = MCT.expand(selected_node)
 
-            result = MCT.simulate(selected_node)
-            MCT.backpropagate(selected_node, result, our_player_id)
-
-            best_move = _get_best_move(MCT)
-            self.propose_move(best_move)
-
-
-def _get_best_move(tree: MonteCarloTree, is_robust: bool = False) -> Move:
-    root = tree.root
+        # Root parallelization: every other core grows an independent MCT with its own random seed, and
+        # periodically reports the statistics of its root children. These are merged with the statistics of our own MCT.
+        result_queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=_run_mcts,
+                args=(self.tree_class, game_state, our_player_id, random.randrange(2**32), worker_id, result_queue),
+                daemon=True,
+            )
+            for worker_id in range((os.cpu_count() or 1) - 1)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            MCT = _init_tree(self.tree_class, game_state, our_player_id)
+            worker_stats = {}  # worker_id -> root statistics of that worker's MCT
+            best_move = None
+            iterations = 0
+            while True:
+                _mcts_iteration(MCT, our_player_id)
+                iterations += 1
+
+                # Only merge the root statistics again when a worker reported, or our own MCT has grown enough.
+                has_new_stats = False
+                while True:
+                    try:
+                        worker_id, stats = result_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    worker_stats[worker_id] = stats
+                    has_new_stats = True
+                if not has_new_stats and iterations % REPORT_INTERVAL != 0:
+                    continue
+
+                new_best_move = _get_best_move(_merge_root_stats([_root_stats(MCT), *worker_stats.values()]))
+                if new_best_move is not None and (best_move is None or new_best_move != best_move):
+                    best_move = new_best_move
+                    self.propose_move(best_move)
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            raise
+
+
+def _init_tree(tree_class: type[MonteCarloTree], game_state: GameState, our_player_id: int) -> MonteCarloTree:
+    """Create an MCT for game_state and run the initial simulation of its root."""
+    tree = tree_class(game_state)
+    result = tree.simulate(tree.root)
+    tree.backpropagate(tree.root, result, our_player_id)
+    return tree
+
+
+def _mcts_iteration(tree: MonteCarloTree, our_player_id: int) -> None:
+    """Run one selection, expansion, simulation and backpropagation step on the MCT."""
+    selected_node = tree.traverse()
+    if selected_node.visit_count > 0:
+        selected_node = tree.expand(selected_node)
+
+    result = tree.simulate(selected_node)
+    tree.backpropagate(selected_node, result, our_player_id)
+
+
+def _run_mcts(
+    tree_class: type[MonteCarloTree],
+    game_state: GameState,
+    our_player_id: int,
+    seed: int,
+    worker_id: int,
+    result_queue: multiprocessing.Queue,
+) -> None:
+    """Worker process: grow an independent MCT and put (worker_id, root statistics) on result_queue every
+    REPORT_INTERVAL iterations. The framework kills the process that computes our move without notice,
+    so the worker stops by itself as soon as that process is gone.
+    """
+    # Don't let exiting wait for results that nobody will read anymore.
+    result_queue.cancel_join_thread()
+    random.seed(seed)
+    # A killed parent is noticed through our parent pid, which changes when we are adopted by another process.
+    # parent_process().is_alive() can't be used: the other workers inherit the pipe it waits on, so it only
+    # reports the parent's death once they have exited as well.
+    parent_pid = os.getppid()
+
+    tree = _init_tree(tree_class, game_state, our_player_id)
+    iterations = 0
+    while os.getppid() == parent_pid:
+        _mcts_iteration(tree, our_player_id)
+        iterations += 1
+        if iterations % REPORT_INTERVAL == 0:
+            result_queue.put((worker_id, _root_stats(tree)))
+
+
+def _root_stats(tree: MonteCarloTree) -> dict:
+    """Returns (square, value) -> (visit count, player 1 wins) for the children of the root."""
+    return {
+        (child.move.square, child.move.value): (child.visit_count, child.player1_wins)
+        for child in tree.root.children
+    }
+
+
+def _merge_root_stats(all_stats: list[dict]) -> dict:
+    """Sum the root statistics of several MCTs per move."""
+    merged = {}
+    for stats in all_stats:
+        for move, (visit_count, player1_wins) in stats.items():
+            total_visits, total_wins = merged.get(move, (0, 0))
+            merged[move] = (total_visits + visit_count, total_wins + player1_wins)
+    return merged
+
+
+def _get_best_move(root_stats: dict, is_robust: bool = False) -> Move | None:
     bestScore = -math.inf
-    bestChild = None
+    bestMove = None
 
-    for child in root.children:
-        if child.visit_count == 0:
+    for (square, value), (visit_count, player1_wins) in root_stats.items():
+        if visit_count == 0:
             continue
         score = (
-            child.visit_count if is_robust else (child.player1_wins / child.visit_count)
+            visit_count if is_robust else (player1_wins / visit_count)
         )
         if score > bestScore:
             bestScore = score
-            bestChild = child
+            bestMove = Move(square, value)
 
-    return bestChild.move
+    return bestMove
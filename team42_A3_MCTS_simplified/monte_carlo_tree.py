@@ -1,48 +1,92 @@
 import copy
-import itertools
 import math
 import random
 
 from competitive_sudoku.sudoku import GameState, Move, SudokuBoard
-from team42_A3_MCTS.check_legal_moves import (
-    get_legal_moves,
-    get_row,
-    get_column,
-    get_block,
-)
+from team42_A3_MCTS.check_legal_moves import get_legal_moves
 
 EXPLORATION_FACTOR = 2
+# Number of moves in a rollout between two checks whether its winner is already decided.
+DECIDED_CHECK_INTERVAL = 8
+
+# Rollouts encode a move as the integer (k << MOVE_VALUE_BITS) | value, with k the index of its square.
+MOVE_VALUE_BITS = 5
+MOVE_VALUE_MASK = (1 << MOVE_VALUE_BITS) - 1
+
+# (m, n) -> for every square index k (see SudokuBoard.square2index), the index of its region and its bit in block_mask.
+_BLOCK_TABLES: dict[tuple[int, int], tuple[tuple[int, ...], tuple[int, ...]]] = {}
+# N -> for every square index k (see SudokuBoard.square2index), the indices of the up to 8 squares around it.
+_NEIGHBORS: dict[int, list[tuple[int, ...]]] = {}
 
 
 class Node:
-    ID_ITER = itertools.count()
+    # Trees grow to many thousands of nodes, slots keep each of them small and its attributes quick to access.
+    __slots__ = (
+        "move",
+        "game_state",
+        "player1_wins",
+        "player2_wins",
+        "visit_count",
+        "ln_visit_count",
+        "uct_score",
+        "children",
+        "child_scores",
+        "child_index",
+        "unvisited_children",
+        "parent",
+    )
 
     def __init__(self, move: Move | None, game_state: GameState):
-        self.id = next(self.ID_ITER)
         self.move = move
         self.game_state = game_state
         self.player1_wins = 0
         self.player2_wins = 0
         self.visit_count = 0
+        self.ln_visit_count = 0.0  # math.log(visit_count), kept up to date by backpropagate for the children's UCT scores
         self.uct_score = math.inf
         self.children = []
+        # UCT scores of the children, in the same order, so traverse can pick the best one with list builtins.
+        self.child_scores = []
+        self.child_index = None  # Position of this node in its parent's children
+        # Children that have not been selected for a simulation yet, in no particular order.
+        self.unvisited_children = []
         self.parent = None
 
     def __repr__(self):
-        parent = self.parent.id if self.parent is not None else "IS ROOT"
+        parent = id(self.parent) if self.parent is not None else "IS ROOT"
         return (
-            f"{self.id}-{self.move} | {parent} | Score:{self.uct_score} | Visits:{self.visit_count} | "
+            f"{id(self)}-{self.move} | {parent} | Score:{self.uct_score} | Visits:{self.visit_count} | "
             f"{self.player1_wins}-{self.player2_wins} | Player:{self.game_state.current_player}"
         )
 
     def add_child(self, child_node):
         child_node.parent = self
+        child_node.child_index = len(self.children)
         self.children.append(child_node)
+        self.child_scores.append(child_node.uct_score)
+        self.unvisited_children.append(child_node)
+
+    def pop_unvisited_child(self) -> "Node":
+        """Remove a random child from the unvisited children and return it."""
+        unvisited = self.unvisited_children
+        i = random.randrange(len(unvisited))
+        child = unvisited[i]
+        unvisited[i] = unvisited[-1]
+        unvisited.pop()
+        return child
 
 
 class MonteCarloTree:
     def __init__(self, game_state: GameState):
-        self.root = Node(None, game_state)
+        # Every state in the tree descends from a clone of the root, so all boards in the tree inherit the root's
+        # bitmasks of the filled cells per region.
+        board = SudokuBoard(game_state.board.m, game_state.board.n)
+        board.squares = game_state.board.squares[:]
+        board.block_of, board.block_bit = _block_tables(board.m, board.n)
+        _init_region_masks(board)
+        root_state = copy.copy(game_state)
+        root_state.board = board
+        self.root = Node(None, _fast_clone(root_state))
 
     def traverse(self) -> Node:
         """
@@ -53,14 +97,20 @@ class MonteCarloTree:
         curr_node = self.root
 
         while len(curr_node.children) > 0:
-            best_score = -math.inf
-            best_node = None
-            # Shuffle the children to randomize the order in which we visit new children.
-            for child in random.sample(curr_node.children, len(curr_node.children)):
-                if best_score < child.uct_score:
-                    best_score = child.uct_score
-                    best_node = child
-            curr_node = best_node
+            # Unvisited children have an infinite UCT score, so one of them wins if there are any.
+            # Such a child is a leaf, since only visited nodes are expanded.
+            if curr_node.unvisited_children:
+                return curr_node.pop_unvisited_child()
+
+            scores = curr_node.child_scores
+            best_score = max(scores)
+            if scores.count(best_score) == 1:
+                curr_node = curr_node.children[scores.index(best_score)]
+            else:
+                # Break ties randomly to randomize the order in which we visit new children.
+                curr_node = random.choice(
+                    [child for child, score in zip(curr_node.children, scores) if score == best_score]
+                )
 
         return curr_node
 
@@ -77,7 +127,7 @@ class MonteCarloTree:
             child = Node(move, _make_move(selected_node.game_state, move))
             selected_node.add_child(child)
 
-        return random.choice(selected_node.children) if moves else selected_node
+        return selected_node.pop_unvisited_child() if moves else selected_node
 
     def simulate(self, selected_node: Node) -> int:
         """
@@ -85,16 +135,24 @@ class MonteCarloTree:
         Simulate the selected node's game state till a final state by making random moves.
         Return the winner (1 or 2), or 0 for draw.
         """
-        current_game_state = selected_node.game_state
+        # The rollout is thrown away afterwards, so copy the state once and make all moves in place.
+        current_game_state = _fast_clone(selected_node.game_state)
+        N = current_game_state.board.N
+        taboo_moves = {
+            (move.square[0] * N + move.square[1]) << MOVE_VALUE_BITS | move.value
+            for move in current_game_state.taboo_moves
+        }
+        # Local names for everything the loop below uses, which saves a global or attribute lookup on every move.
+        scores = current_game_state.scores
+        legal_moves_of, rand, apply_move = _legal_move_codes, random.random, _APPLY_MOVE
 
         player1_out_of_moves = False
         player2_out_of_moves = False
+        n_moves = 0
         while True:
             # Condtion 1: Both players are out of moves; End of game.
             if player1_out_of_moves and player2_out_of_moves:
-                score_difference = (
-                    current_game_state.scores[0] - current_game_state.scores[1]
-                )
+                score_difference = scores[0] - scores[1]
                 return 1 if score_difference > 0 else 2 if score_difference < 0 else 0
             # Condition 2: The current player is out of moves. Switch to the other player.
             if (current_game_state.current_player == 1 and player1_out_of_moves) or (
@@ -105,7 +163,7 @@ class MonteCarloTree:
                 )
 
             # Generate all legal moves of current player.
-            legal_moves = get_legal_moves(current_game_state)
+            legal_moves = legal_moves_of(current_game_state, taboo_moves)
             # If no legal moves exists, mark the player as unable to move and restart the loop.
             if len(legal_moves) == 0:
                 if current_game_state.current_player == 1:
@@ -114,10 +172,18 @@ class MonteCarloTree:
                     player2_out_of_moves = True
                 continue
             # Play a random legal move
-            current_game_state = _make_move(
-                current_game_state, random.choice(legal_moves)
+            move = legal_moves[int(rand() * len(legal_moves))]
+            apply_move[current_game_state.current_player](
+                current_game_state, Move(divmod(move >> MOVE_VALUE_BITS, N), move & MOVE_VALUE_MASK)
             )
 
+            # Stop early once the rest of the game can't change the winner anymore.
+            n_moves += 1
+            if n_moves % DECIDED_CHECK_INTERVAL == 0:
+                winner = _decided_winner(current_game_state)
+                if winner is not None:
+                    return winner
+
     def backpropagate(self, simulated_node: Node, winner: int, player: int):
         """
         STEP 4: Backpropagation
@@ -128,6 +194,7 @@ class MonteCarloTree:
 
         while current_node is not None:
             current_node.visit_count += 1
+            current_node.ln_visit_count = math.log(current_node.visit_count)
             if winner == 1:
                 current_node.player1_wins += 1
             elif winner == 2:
@@ -138,6 +205,8 @@ class MonteCarloTree:
             else:
                 pass
             current_node.uct_score = _calculate_score(current_node, player)
+            if current_node.parent is not None:
+                current_node.parent.child_scores[current_node.child_index] = current_node.uct_score
             current_node = current_node.parent
 
 
@@ -147,20 +216,48 @@ def _calculate_score(node: Node, player: int) -> float:
     if node.parent is None:
         return 0
 
-    modifier = -1 if node.game_state.current_player == 1 else 1
-    q = modifier * node.player1_wins if player == 1 else modifier * node.player2_wins
-
     n = node.visit_count
     if n == 0:
         return math.inf
 
-    ln_n = math.log(node.parent.visit_count)
-    return (q / n) + EXPLORATION_FACTOR * math.sqrt(ln_n / n)
+    modifier = -1 if node.game_state.current_player == 1 else 1
+    q = modifier * node.player1_wins if player == 1 else modifier * node.player2_wins
+
+    return (q / n) + EXPLORATION_FACTOR * math.sqrt(node.parent.ln_visit_count / n)
+
+
+def _fast_clone(game_state: GameState) -> GameState:
+    """Copy a game state at a fraction of the cost of copy.deepcopy.
+    Only the fields that making a move changes are copied; the initial board, taboo moves, move history and
+    allowed squares are shared.
+    """
+    board = game_state.board
+    new_board = SudokuBoard.__new__(SudokuBoard)
+    new_board.m, new_board.n, new_board.N = board.m, board.n, board.N
+    new_board.squares = board.squares[:]
+    new_board.row_mask = board.row_mask[:]
+    new_board.col_mask = board.col_mask[:]
+    new_board.block_mask = board.block_mask[:]
+    new_board.block_of, new_board.block_bit = board.block_of, board.block_bit
+
+    new_state = GameState.__new__(GameState)
+    new_state.initial_board = game_state.initial_board
+    new_state.board = new_board
+    new_state.taboo_moves = game_state.taboo_moves
+    new_state.moves = game_state.moves
+    new_state.scores = game_state.scores[:]
+    new_state.current_player = game_state.current_player
+    new_state.allowed_squares1 = game_state.allowed_squares1
+    new_state.allowed_squares2 = game_state.allowed_squares2
+    new_state.occupied_squares1 = game_state.occupied_squares1[:]
+    new_state.occupied_squares2 = game_state.occupied_squares2[:]
+    return new_state
 
 
 def _make_move(game_state: GameState, move: Move) -> GameState:
     """Create a new game state that happens after the given move was performed.
     Taboo moves are not added, the sudoku is assumed to remain solvable after any move.
+    The move history is not extended either, since nothing in the tree reads it.
 
     Args:
         game_state: State of the game before the move.
@@ -169,35 +266,176 @@ def _make_move(game_state: GameState, move: Move) -> GameState:
     Returns:
         The next state that follows from performing the given move.
     """
-    new_state = copy.deepcopy(game_state)
-    new_state.board.put(move.square, move.value)
-    new_state.moves.append(move)
+    new_state = _fast_clone(game_state)
+    _apply_move_inplace(new_state, move)
+    return new_state
 
-    move_score = _move_score(new_state.board, move.square)
-    new_state.scores[new_state.current_player - 1] += move_score
 
-    if new_state.current_player == 1:
-        new_state.occupied_squares1 += [move.square]
-    else:
-        new_state.occupied_squares2 += [move.square]
+def _apply_move_inplace(game_state: GameState, move: Move) -> None:
+    """Perform the given move on game_state itself, without making a copy.
+
+    Args:
+        game_state: State of the game, which is modified.
+        move: The move to make. Move is assumed to be valid.
+    """
+    _APPLY_MOVE[game_state.current_player](game_state, move)
 
-    new_state.current_player = 3 - new_state.current_player
-    return new_state
+
+def _apply_move_p1(game_state: GameState, move: Move) -> None:
+    """_apply_move_inplace for a move of player 1."""
+    _put(game_state.board, move.square, move.value)
+    move_score = _move_score(game_state.board, move.square)
+    game_state.scores[0] += move_score
+    game_state.occupied_squares1.append(move.square)
+    game_state.current_player = 2
+
+
+def _apply_move_p2(game_state: GameState, move: Move) -> None:
+    """_apply_move_inplace for a move of player 2."""
+    _put(game_state.board, move.square, move.value)
+    move_score = _move_score(game_state.board, move.square)
+    game_state.scores[1] += move_score
+    game_state.occupied_squares2.append(move.square)
+    game_state.current_player = 1
+
+
+# Player -> the _apply_move_inplace specialized for that player, so the rollouts don't branch on the player every move.
+_APPLY_MOVE = (None, _apply_move_p1, _apply_move_p2)
+
+
+def _init_region_masks(board: SudokuBoard) -> None:
+    """Store bitmasks of the filled cells of every row, column and region on the board.
+    Bit c of row_mask[r], bit r of col_mask[c] and bit k of block_mask[b] (for the k-th cell of region b)
+    are set if that cell is filled, so a row/column/region is full iff its mask is (1 << N) - 1.
+    """
+    N = board.N
+    board.row_mask, board.col_mask, board.block_mask = [0] * N, [0] * N, [0] * N
+    for k, value in enumerate(board.squares):
+        if value != board.empty:
+            _set_filled_bits(board, board.index2square(k))
+
+
+def _set_filled_bits(board: SudokuBoard, square: tuple[int, int]) -> None:
+    """Flip the bits of square in the region bitmasks of the board."""
+    row, col = square
+    k = row * board.N + col
+    board.row_mask[row] ^= 1 << col
+    board.col_mask[col] ^= 1 << row
+    board.block_mask[board.block_of[k]] ^= board.block_bit[k]
+
+
+def _put(board: SudokuBoard, square: tuple[int, int], value: int) -> None:
+    """Put a value on an empty square and mark it as filled in the region bitmasks."""
+    board.put(square, value)
+    _set_filled_bits(board, square)
 
 
 def _move_score(board: SudokuBoard, square: tuple[int, int]) -> int:
     """Compute the score for the most recent move 'square' and a given board."""
     score = [0, 1, 3, 7]
-    n_filled = 0
-    for get_region in (get_row, get_column, get_block):
-        region = get_region(board, square)
-        # Region is filled if there are no empty cells.
-        is_filled = 0 not in region
-        n_filled += is_filled
+    row, col = square
+    # Region is filled if all of its bits are set.
+    full_mask = (1 << board.N) - 1
+    n_filled = (
+        (board.row_mask[row] == full_mask)
+        + (board.col_mask[col] == full_mask)
+        + (board.block_mask[board.block_of[row * board.N + col]] == full_mask)
+    )
 
     return score[n_filled]
 
 
+def _decided_winner(game_state: GameState) -> int | None:
+    """Returns the player that wins regardless of the remaining moves, or None if the game is still open.
+    A move scores at most 7 points for completing 3 regions, so the remaining moves bring in at most 7/3 points
+    for every region that is not complete yet.
+    """
+    board = game_state.board
+    full_mask = (1 << board.N) - 1
+    open_regions = sum(
+        mask != full_mask for masks in (board.row_mask, board.col_mask, board.block_mask) for mask in masks
+    )
+    score_difference = game_state.scores[0] - game_state.scores[1]
+    if 3 * abs(score_difference) > 7 * open_regions:
+        return 1 if score_difference > 0 else 2
+    return None
+
+
+def _block_tables(m: int, n: int) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """Returns the region index and the region bit of every square of a board with m x n regions,
+    computed once per region size.
+    """
+    if (m, n) not in _BLOCK_TABLES:
+        N = m * n
+        squares = [(row, col) for row in range(N) for col in range(N)]
+        _BLOCK_TABLES[m, n] = (
+            tuple(row // m * m + col // n for row, col in squares),
+            tuple(1 << (row % m * n + col % n) for row, col in squares),
+        )
+    return _BLOCK_TABLES[m, n]
+
+
+def _neighbor_table(N: int) -> list[tuple[int, ...]]:
+    """Returns the neighbor indices of every square of an N x N board, computed once per board size."""
+    if N not in _NEIGHBORS:
+        _NEIGHBORS[N] = [
+            tuple(
+                (row + dr) * N + col + dc
+                for dr in (-1, 0, 1)
+                for dc in (-1, 0, 1)
+                if (dr, dc) != (0, 0) and 0 <= row + dr < N and 0 <= col + dc < N
+            )
+            for row in range(N)
+            for col in range(N)
+        ]
+    return _NEIGHBORS[N]
+
+
+def _player_squares(game_state: GameState) -> list[tuple[int, int]] | None:
+    """Same as game_state.player_squares(), but looks up the neighbors of occupied squares in a precomputed table
+    instead of generating them, which matters in the rollouts where this is called every ply.
+    """
+    allowed_squares = game_state.allowed_squares1 if game_state.current_player == 1 else game_state.allowed_squares2
+    if allowed_squares is None:
+        return None
+    occupied_squares = game_state.occupied_squares1 if game_state.current_player == 1 else game_state.occupied_squares2
+
+    squares, N, empty = game_state.board.squares, game_state.board.N, game_state.board.empty
+    neighbors = _neighbor_table(N)
+    result = {k for k in (row * N + col for row, col in allowed_squares) if squares[k] == empty}
+    for row, col in occupied_squares:
+        result.update(k for k in neighbors[row * N + col] if squares[k] == empty)
+    return [divmod(k, N) for k in sorted(result)]
+
+
+def _legal_move_codes(game_state: GameState, taboo_moves: set[int]) -> list[int]:
+    """Same as get_legal_moves, but returns the moves encoded as integers (see MOVE_VALUE_BITS) and takes the
+    taboo moves as a set of encoded moves. A rollout plays only one of the legal moves every turn,
+    so this saves creating a Move object for all the others.
+    """
+    board = game_state.board
+    squares, N, m, n = board.squares, board.N, board.m, board.n
+    player_squares = _player_squares(game_state)
+    # If player_squares is None, then every empty square is an allowed square.
+    if player_squares is None:
+        player_squares = [divmod(k, N) for k, value in enumerate(squares) if value == board.empty]
+
+    all_values = range(1, N + 1)
+    legal_moves = []
+    for row, col in player_squares:
+        used_values = set(squares[row * N : (row + 1) * N])
+        used_values.update(squares[col::N])
+        region_row, region_col = row // m * m, col // n * n
+        for i in range(region_row * N + region_col, (region_row + m) * N, N):
+            used_values.update(squares[i : i + n])
+
+        k = (row * N + col) << MOVE_VALUE_BITS
+        legal_moves.extend(
+            k | value for value in all_values if value not in used_values and k | value not in taboo_moves
+        )
+    return legal_moves
+
+
 def _remove_duplicates(moves: list[Move]) -> list[Move]:
     """If there are multiple values for a square, pick one randomly."""
     moves_dict = {}  # square -> [values]
@@ -1,4 +1,3 @@
-import copy
 import random
 
 from competitive_sudoku.sudoku import GameState, Move
@@ -8,8 +7,13 @@ from team42_A3_MCTS.monte_carlo_tree import (
     MonteCarloTree,
     Node,
     _remove_duplicates,
+    _fast_clone,
     _make_move,
-    _move_score
+    _APPLY_MOVE,
+    _player_squares,
+    _neighbor_table,
+    _decided_winner,
+    DECIDED_CHECK_INTERVAL,
 )
 from team42_A3_MCTS.sudoku_heuristics import sudoku_heuristics
 
@@ -41,22 +45,22 @@ class MCTSimplified(MonteCarloTree):
             selected_node.add_child(child)
 
         # Children are ordered by score, so we pick the most promising one first.
-        return selected_node.children[0] if selected_node.children else selected_node
+        if not selected_node.children:
+            return selected_node
+        selected_node.unvisited_children.remove(selected_node.children[0])
+        return selected_node.children[0]
 
     def _get_promising_moves(self, game_state: GameState, moves: list[Move], count=3) -> list[tuple[Move, GameState, float]]:
         """Select the 'count' most promising moves from the given list of moves.
         Returns a tuple of the selected moves, their next game state and the evaluation score.
         """
-        move_tuples = []  # [(move, new_state, score),]
-        for move in moves:
-            new_state = _make_move(game_state, move)
-            score = evaluate_state(new_state)
-            move_tuples.append((move, new_state, score))
+        # Score all moves at once, only the selected moves get a state of their own.
+        scored_moves = list(zip(moves, _evaluate_moves(game_state, moves)))  # [(move, score),]
 
         # Expand only the 3 most promising moves to keep the branching factor low.
         player = game_state.current_player
-        move_tuples.sort(key=lambda x: x[2], reverse=player == 1)
-        return move_tuples[:count]
+        scored_moves.sort(key=lambda x: x[1], reverse=player == 1)
+        return [(move, _make_move(game_state, move), score) for move, score in scored_moves[:count]]
 
 
     def simulate(self, selected_node: Node, search_depth=0.5) -> int:
@@ -70,23 +74,56 @@ class MCTSimplified(MonteCarloTree):
         Returns:
             0, 1 or 2 corresponding to a draw, p1 wins and p2 wins respectively.
         """
-        game_state = copy.deepcopy(selected_node.game_state)
-
-        n_moves = min(game_state.board.squares.count(game_state.board.empty), round(search_depth * game_state.board.N ** 2))
+        game_state = _fast_clone(selected_node.game_state)
+        board = game_state.board
+        # Local names for everything the loop below uses, which saves a global or attribute lookup on every move.
+        N, squares, empty, scores = board.N, board.squares, board.empty, game_state.scores
+        neighbors = _neighbor_table(N)
+        rand = random.random
+        make_move, remove_free_square = _simplified_make_move, _remove_free_square
+
+        # The squares (as indices) each player can play on, with the position of every square in its list.
+        # These are updated after every move instead of recomputed, and allow picking and removing a square in O(1).
+        free_squares, free_positions = {}, {}
+        for player in (1, 2):
+            free_squares[player] = _player_square_indices(game_state, player)
+            free_positions[player] = {k: i for i, k in enumerate(free_squares[player])}
+
+        n_moves = min(squares.count(empty), round(search_depth * N ** 2))
+        n_moves_played = 0
         while n_moves > 0:
-            legal_squares = game_state.player_squares()
+            player = game_state.current_player
+            legal_squares = free_squares[player]
             if not legal_squares:
-                game_state.current_player = 3 - game_state.current_player
+                # Neither player can move anymore, so the game is over.
+                if not free_squares[3 - player]:
+                    break
+                game_state.current_player = 3 - player
                 continue
-            else:
-                game_state = _simplified_make_move(game_state, random.choice(legal_squares))
+
+            k = legal_squares[int(rand() * len(legal_squares))]
+            game_state = make_move(game_state, divmod(k, N))
+            remove_free_square(free_squares[1], free_positions[1], k)
+            remove_free_square(free_squares[2], free_positions[2], k)
+            # The player can now also reach the empty squares around the square it just played on.
+            positions = free_positions[player]
+            for neighbor in neighbors[k]:
+                if squares[neighbor] == empty and neighbor not in positions:
+                    positions[neighbor] = len(legal_squares)
+                    legal_squares.append(neighbor)
 
             n_moves -= 1
+            # Stop early once the rest of the game can't change the winner anymore.
+            n_moves_played += 1
+            if n_moves_played % DECIDED_CHECK_INTERVAL == 0:
+                winner = _decided_winner(game_state)
+                if winner is not None:
+                    return winner
 
         if n_moves > 0:
             state_score = evaluate_state(game_state)
         else:
-            state_score = game_state.scores[0] - game_state.scores[1]
+            state_score = scores[0] - scores[1]
 
         if state_score > 0:
             return 1
@@ -111,15 +148,61 @@ def _simplified_make_move(game_state: GameState, square: tuple[int, int]) -> Gam
     DUMMY_VALUE = 42  # Used as a placeholder, given that we do not care about values.
     assert DUMMY_VALUE != game_state.board.empty
 
-    game_state.board.put(square, DUMMY_VALUE)
-
-    move_score = _move_score(game_state.board, square)
-    game_state.scores[game_state.current_player - 1] += move_score
+    _APPLY_MOVE[game_state.current_player](game_state, Move(square, DUMMY_VALUE))
+    return game_state
 
-    if game_state.current_player == 1:
-        game_state.occupied_squares1 += [square]
-    else:
-        game_state.occupied_squares2 += [square]
 
-    game_state.current_player = 3 - game_state.current_player
-    return game_state
+def _evaluate_moves(game_state: GameState, moves: list[Move]) -> list[float]:
+    """Returns evaluate_state of the state after each of the moves, without making them.
+    The squares both players can play on are collected once; a move only changes those of the mover by its square
+    and the empty squares around it, and those of the other player by its square.
+    """
+    board = game_state.board
+    N = board.N
+    full_mask = (1 << N) - 1
+    neighbors = _neighbor_table(N)
+    player = game_state.current_player
+    player_squares = {p: set(_player_square_indices(game_state, p)) for p in (1, 2)}
+    own_squares, other_squares = player_squares[player], player_squares[3 - player]
+    score_difference = game_state.scores[0] - game_state.scores[1]
+
+    scores = []
+    for move in moves:
+        row, col = move.square
+        k = row * N + col
+        n_filled = (
+            (board.row_mask[row] | 1 << col == full_mask)
+            + (board.col_mask[col] | 1 << row == full_mask)
+            + (board.block_mask[board.block_of[k]] | board.block_bit[k] == full_mask)
+        )
+        move_score = (0, 1, 3, 7)[n_filled]
+
+        own_space = len(own_squares) - (k in own_squares) + sum(
+            1 for neighbor in neighbors[k] if board.squares[neighbor] == board.empty and neighbor not in own_squares
+        )
+        other_space = len(other_squares) - (k in other_squares)
+        if player == 1:
+            scores.append(score_difference + move_score + (own_space - other_space) / N)
+        else:
+            scores.append(score_difference - move_score + (other_space - own_space) / N)
+    return scores
+
+
+def _player_square_indices(game_state: GameState, player: int) -> list[int]:
+    """Returns the indices of the squares that player can play on, see _player_squares."""
+    current_player = game_state.current_player
+    game_state.current_player = player
+    squares = _player_squares(game_state)
+    game_state.current_player = current_player
+    return [row * game_state.board.N + col for row, col in squares]
+
+
+def _remove_free_square(free_squares: list[int], positions: dict[int, int], k: int) -> None:
+    """Remove square index k from free_squares (if present) in O(1) by moving the last square into its place."""
+    i = positions.pop(k, None)
+    if i is None:
+        return
+    last = free_squares.pop()
+    if last != k:
+        free_squares[i] = last
+        positions[last] = i